@@ -4,7 +4,6 @@ import random
 import warnings
 from itertools import repeat
 from collections import Counter
-from sets import Set
 
 try:
     import numpy as np
@@ -24,22 +24,236 @@ parameter is set independently of all the others.
 """
 
 import random
+import warnings
+from multiprocessing import Pool, cpu_count
 
 import sys
 print(sys.path)
 import csv
 
-from colag.colag import Colag, get_param_value, toggled
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+    warnings.warn('install numba for the compiled learner fast path')
+
+from colag.colag import Colag
 from datetime import datetime
 
 def param_list_to_grammar(params):
     """Given a list of 0s and 1s `params`, treat it as a bitstring and
     return its integer value."""
-    grammar = 0
-    total_bits = len(params)
-    for bit, value in enumerate(params):
-        grammar += value * (2 ** (total_bits - bit - 1))
-    return grammar
+    params = np.asarray(params, dtype=np.int64)
+    pow2 = 1 << np.arange(params.size - 1, -1, -1)
+    return int(params @ pow2)
+
+def _legal_grammar_bitmap(domain):
+    """Returns a bool array of length 2**num_params where entry g is True iff
+    grammar id g exists in the domain. Built once and cached on the domain.
+    """
+    legal = getattr(domain, '_legal_bitmap', None)
+    if legal is None:
+        legal = np.zeros(1 << domain.num_params, dtype=np.bool_)
+        legal[list(domain.language)] = True
+        domain._legal_bitmap = legal
+    return legal
+
+def _language_csr(domain):
+    """Returns the domain's languages flattened into a CSR-style pair
+    (indptr, data): the sentence ids of grammar g, sorted, live in
+    data[indptr[g]:indptr[g+1]]. This is the layout the compiled consume
+    kernel searches. Built once and cached on the domain.
+    """
+    csr = getattr(domain, '_language_csr_cache', None)
+    if csr is None:
+        indptr = np.zeros((1 << domain.num_params) + 1, dtype=np.int64)
+        for grammar, sents in domain.language.items():
+            indptr[grammar + 1] = len(sents)
+        np.cumsum(indptr, out=indptr)
+        data = np.empty(indptr[-1], dtype=np.int64)
+        for grammar, sents in domain.language.items():
+            data[indptr[grammar]:indptr[grammar + 1]] = np.sort(
+                np.fromiter(sents, dtype=np.int64, count=len(sents)))
+        domain._language_csr_cache = csr = (indptr, data)
+    return csr
+
+_kernel_cache = {}
+
+def _build_kernels(num_lanes):
+    """Compile the consume/trial kernels with the padded lane count baked in
+    as a compile-time constant, so every per-parameter loop has a fixed trip
+    count that LLVM can fully unroll. The domain's parameter count is fixed
+    at load time, so one kernel set per lane count (cached here) covers the
+    whole run. Returns (consume, consume_masked, run_trials), or None when
+    numba is unavailable.
+    """
+    if njit is None:
+        return None
+    kernels = _kernel_cache.get(num_lanes)
+    if kernels is not None:
+        return kernels
+
+    @njit
+    def consume_reward_only(weights, pow2, legal, indptr, data, sentence, lr_vec):
+        """One consume step for a reward-only learner, compiled with numba.
+
+        Picks a hypothesis grammar by weighted coin flips (rejecting illegal
+        grammar ids), checks whether `sentence` parses in it via binary search
+        in the CSR language data, and if so rewards `weights` in place using
+        the per-parameter learning rates in `lr_vec`. Returns the hypothesis
+        grammar id.
+        """
+        while True:
+            grammar = 0
+            for i in range(num_lanes):
+                if np.random.random() < weights[i]:
+                    grammar += pow2[i]
+            if legal[grammar]:
+                break
+        lo = indptr[grammar]
+        hi = indptr[grammar + 1]
+        idx = lo + np.searchsorted(data[lo:hi], sentence)
+        if idx < hi and data[idx] == sentence:
+            for i in range(num_lanes):
+                bit = 1.0 if grammar & pow2[i] else 0.0
+                weights[i] += lr_vec[i] * (bit - weights[i])
+        return grammar
+
+    @njit
+    def consume_reward_masked(weights, pow2, legal, indptr, data, sentence,
+                              lr, update_mask, half_mask, half_discount):
+        """Like consume_reward_only, but the per-parameter learning rates
+        are decoded on the fly from the packed per-sentence trigger masks:
+        the rate is 0 where the update bit is clear and lr * (1 -
+        half_discount) where the ambiguity bit is set.
+        """
+        while True:
+            grammar = 0
+            for i in range(num_lanes):
+                if np.random.random() < weights[i]:
+                    grammar += pow2[i]
+            if legal[grammar]:
+                break
+        lo = indptr[grammar]
+        hi = indptr[grammar + 1]
+        idx = lo + np.searchsorted(data[lo:hi], sentence)
+        if idx < hi and data[idx] == sentence:
+            u = update_mask[sentence]
+            h = half_mask[sentence]
+            for i in range(num_lanes):
+                mult = 1.0 if u & pow2[i] else 0.0
+                if h & pow2[i]:
+                    mult -= half_discount
+                bit = 1.0 if grammar & pow2[i] else 0.0
+                weights[i] += lr * mult * (bit - weights[i])
+        return grammar
+
+    @njit(parallel=True)
+    def run_trials_reward_only(weights, pow2, legal, indptr, data, language,
+                               lr_masks, has_masks, lr, iterations, threshold):
+        """Run every learner trial for one target grammar in parallel.
+
+        `weights` is a (num_learners, num_lanes) matrix, one row per
+        independent trial; rows are stepped in parallel with prange. Each
+        trial draws its own random sentences from `language` and stops once
+        its weights converge or `iterations` is reached. When `has_masks` is
+        set, `lr_masks[sentence]` supplies per-parameter learning-rate
+        multipliers (the relevant/skeptical learners). Returns the number of
+        sentences each trial consumed.
+        """
+        num_learners = weights.shape[0]
+        counts = np.zeros(num_learners, np.int64)
+        for t in prange(num_learners):
+            w = weights[t]
+            steps = 0
+            while steps < iterations:
+                converged = True
+                for i in range(num_lanes):
+                    if not (w[i] < threshold or w[i] > 1.0 - threshold):
+                        converged = False
+                        break
+                if converged:
+                    break
+                sentence = language[np.random.randint(0, language.shape[0])]
+                while True:
+                    grammar = 0
+                    for i in range(num_lanes):
+                        if np.random.random() < w[i]:
+                            grammar += pow2[i]
+                    if legal[grammar]:
+                        break
+                lo = indptr[grammar]
+                hi = indptr[grammar + 1]
+                idx = lo + np.searchsorted(data[lo:hi], sentence)
+                if idx < hi and data[idx] == sentence:
+                    for i in range(num_lanes):
+                        bit = 1.0 if grammar & pow2[i] else 0.0
+                        step_lr = lr * lr_masks[sentence, i] if has_masks else lr
+                        w[i] += step_lr * (bit - w[i])
+                steps += 1
+            counts[t] = steps
+        return counts
+
+    _kernel_cache[num_lanes] = kernels = (consume_reward_only,
+                                          consume_reward_masked,
+                                          run_trials_reward_only)
+    return kernels
+
+def _sentence_trigger_masks(domain):
+    """Packs each sentence's irrelevance string into two uint16 bitmaps,
+    returned as a pair of arrays indexed by sentence id. In update_mask[s]
+    the bit for parameter i is set when the sentence is relevant to Pi
+    (char != '~'); in half_mask[s] it is set when the evidence is ambiguous
+    ('*'). Bit positions match the grammar-id encoding, most significant
+    parameter first. Built once and cached on the domain.
+    """
+    masks = getattr(domain, '_trigger_masks', None)
+    if masks is None:
+        num_params = domain.num_params
+        update = np.zeros(max(domain.sentences) + 1, dtype=np.uint16)
+        half = np.zeros_like(update)
+        for sentence in domain.sentences:
+            u = 0
+            h = 0
+            for i, ch in enumerate(domain.sentence_irr[sentence]):
+                bit = 1 << (num_params - 1 - i)
+                if ch != '~':
+                    u |= bit
+                if ch == '*':
+                    h |= bit
+            update[sentence] = u
+            half[sentence] = h
+        domain._trigger_masks = masks = (update, half)
+    return masks
+
+def _sentence_lr_matrix(domain, ambiguous=1.0):
+    """Dense (num_sentences, num_params) float32 learning-rate multiplier
+    matrix, indexed directly by sentence id: 0 for '~', `ambiguous` for '*',
+    1 otherwise. This is the form the batched kernel wants. Unpacked from
+    the packed trigger masks once and cached on the domain.
+    """
+    attr = '_lr_matrix_%s' % ambiguous
+    mat = getattr(domain, attr, None)
+    if mat is None:
+        update, half = _sentence_trigger_masks(domain)
+        # padded to whole SIMD lanes like the weight vectors; pow2 is 0 in
+        # the padding columns so their multipliers come out 0
+        pow2 = np.zeros(_padded_size(domain.num_params), dtype=np.int64)
+        pow2[:domain.num_params] = 1 << np.arange(domain.num_params - 1, -1, -1)
+        mat = (((update[:, None] & pow2) != 0).astype(np.float32)
+               - np.float32(1.0 - ambiguous) * ((half[:, None] & pow2) != 0))
+        setattr(domain, attr, mat)
+    return mat
+
+def _padded_size(num_params):
+    """Round up to a whole number of 16-float SIMD lanes. Learner weight
+    vectors are padded to this size; the padding lanes hold 0 everywhere
+    (weights, masks, learning rates) so vector ops can run full-width
+    without affecting them."""
+    return ((num_params + 15) // 16) * 16
 
 def weighted_coin_flip(weight):
     " Returns 1 with a probability of `weight`, otherwise 0. "
@@ -72,7 +286,28 @@ class VariationalLearner:
 
         self.domain = domain
         self.learning_rate = learning_rate
-        self.weights = [0.5] * domain.num_params
+        # float32 is ample precision for weights nudged by lr=5e-4, and the
+        # padded buffer is exactly one AVX-512 (two AVX2) register wide
+        num_lanes = _padded_size(domain.num_params)
+        self.weights = np.zeros(num_lanes, dtype=np.float32)
+        self.weights[:domain.num_params] = 0.5
+        self.rng = np.random.default_rng()
+        # powers of two for packing a vector of bits into a grammar id, most
+        # significant parameter first. doubles as the per-parameter bit masks
+        # when extracting bits back out of a grammar id. zero in the padding
+        # lanes, so they never contribute a bit.
+        self._pow2 = np.zeros(num_lanes, dtype=np.int64)
+        self._pow2[:domain.num_params] = 1 << np.arange(domain.num_params - 1, -1, -1)
+        self._uniform_lr = np.zeros(num_lanes)
+        self._uniform_lr[:domain.num_params] = learning_rate
+        # consume kernels specialized to this lane count (None without numba)
+        self._kernels = _build_kernels(num_lanes)
+        # integer sampling thresholds derived from the weights; recomputed
+        # lazily whenever the weights change (see choose_grammar)
+        self._thresh16 = None
+        self._thresh_stale = True
+        self._legal = _legal_grammar_bitmap(domain)
+        self._lang_indptr, self._lang_data = _language_csr(domain)
 
     def consume(self, sentence):
         """ Update the parameter weights based on the knowledge that `sentence`
@@ -84,9 +319,35 @@ class VariationalLearner:
         else:
             self.punish(hypothesis_grammar, sentence)
 
+    def _consume_compiled(self, sentence, lr_vec):
+        """Run one consume step through the numba kernel. Only valid for
+        learners whose punish is a no-op.
+        """
+        self._thresh_stale = True
+        consume_reward_only = self._kernels[0]
+        return consume_reward_only(self.weights, self._pow2, self._legal,
+                                   self._lang_indptr, self._lang_data,
+                                   sentence, lr_vec)
+
+    def _consume_compiled_masked(self, sentence):
+        """Compiled consume step that decodes per-parameter learning rates
+        from the packed trigger masks. Only valid for learners whose punish
+        is a no-op.
+        """
+        self._thresh_stale = True
+        consume_reward_masked = self._kernels[1]
+        return consume_reward_masked(self.weights, self._pow2, self._legal,
+                                     self._lang_indptr, self._lang_data,
+                                     sentence, self.learning_rate,
+                                     self._update_mask, self._half_mask,
+                                     self._half_discount)
+
     def parses(self, grammar, sentence):
         """ Returns True if `sentence` parses in `grammar`. """
-        return sentence in self.domain.language[grammar]
+        lo = self._lang_indptr[grammar]
+        hi = self._lang_indptr[grammar + 1]
+        idx = lo + np.searchsorted(self._lang_data[lo:hi], sentence)
+        return bool(idx < hi and self._lang_data[idx] == sentence)
 
     def choose_grammar(self):
         """Returns a random grammar valid in the language domain.
@@ -94,24 +355,34 @@ class VariationalLearner:
         Each param is picked independently at random weighted by the
         corresponding weight in self.weights. If self.weights[0] is 0.2,
         then parameter 1 has a 20% chance of being set to 1.
+
+        Rather than drawing a float per parameter, the weights are quantized
+        to 16-bit integer thresholds (cached until the weights next change)
+        and compared against one vector of 16-bit random draws. The
+        quantization error is at most 2**-16 per parameter, far below the
+        learning rate.
         """
-        grammar = None
-        while not self.domain.legal_grammar(grammar):
-            grammar = 0
-            for index, w in enumerate(self.weights):
-                if random.random() < w:
-                    grammar = toggled(12 - index, grammar) # toggle the bit in
-                                                           # the grammar int
-        return grammar
+        if self._thresh_stale:
+            # uint32 rather than uint16 so a weight of exactly 1.0 maps to
+            # 65536, which no draw can reach -- the bit is always set.
+            self._thresh16 = (self.weights * 65536.0).astype(np.uint32)
+            self._thresh_stale = False
+        while True:
+            r = self.rng.integers(0, 1 << 16, size=self.weights.size,
+                                  dtype=np.uint32)
+            bits = (r < self._thresh16).astype(np.int64)
+            grammar = int(bits @ self._pow2)
+            if self._legal[grammar]:
+                return grammar
 
     def converged(self, threshold):
         """Returns true if all values in `weights` list are less than
         `threshold` away from 0 or 1.
         """
-        for w in self.weights:
-            if not (1 - w < threshold) or (w < threshold):
-                return False
-        return True
+        # runs full-width over the padded buffer: the padding lanes sit at 0,
+        # which always passes the near-0 test
+        w = self.weights
+        return bool(np.all((w < threshold) | (w > 1 - threshold)))
 
     def reward(self, hypothesis_grammar, sentence):
         """ Updates the param weights based on the knowledge that `sentence`
@@ -126,18 +397,27 @@ class VariationalLearner:
         raise NotImplementedError()
 
     def best_guess(self):
-        return param_list_to_grammar([round(p) for p in self.weights])
+        return param_list_to_grammar(
+            [int(round(p)) for p in self.weights[:self.domain.num_params]])
 
 class RewardOnlyLearner(VariationalLearner):
     """ Variational learner that only updates weights if sentence parses in grammar. """
+    # learning-rate multiplier for ambiguous ('*') evidence; None means the
+    # learner ignores irrelevance strings entirely.
+    ambiguous_lr = None
+
+    def consume(self, sentence):
+        if self._kernels is not None:
+            self._consume_compiled(sentence, self._uniform_lr)
+        else:
+            super().consume(sentence)
+
     def reward(self, hypothesis_grammar, sentence):
-        for index in range(13):
-            val = get_param_value(12-index, hypothesis_grammar)
-            weight = self.weights[index]
-            if val == 0:
-                self.weights[index] -= self.learning_rate * weight
-            elif val == 1:
-                self.weights[index] += self.learning_rate * (1-weight)
+        # w += lr * (bit - w) is algebraically the same as nudging w down by
+        # lr*w when the bit is 0 and up by lr*(1-w) when the bit is 1.
+        bits = ((hypothesis_grammar & self._pow2) != 0).astype(np.float64)
+        self.weights += self.learning_rate * (bits - self.weights)
+        self._thresh_stale = True
 
     def punish(*args):
         pass
@@ -145,57 +425,58 @@ class RewardOnlyLearner(VariationalLearner):
 class RewardOnlyRelevantLearner(VariationalLearner):
     """Reward-only learner that ignores irrelevant parameter evidence.
     """
+    ambiguous_lr = 1.0
+
+    def __init__(self, domain, learning_rate=.0005):
+        super().__init__(domain, learning_rate)
+        self._update_mask, self._half_mask = _sentence_trigger_masks(domain)
+        self._half_discount = 1.0 - self.ambiguous_lr
+
+    def consume(self, sentence):
+        if self._kernels is not None:
+            self._consume_compiled_masked(sentence)
+        else:
+            super().consume(sentence)
+
     def reward(self, hypothesis_grammar, sentence):
         """ If `sentence` is known to be irrelevant to the parameter setting of Pi, do
         not update the weights for Pi. The other parameters might still be updated.
         The irrelevance is a per-sentence/per-parameter consideration.
         """
 
-        trigger_str = self.domain.sentence_irr[sentence]
-        for index in range(13):
-            if trigger_str[index] == '~':
-                continue
-            val = get_param_value(12-index, hypothesis_grammar)
-            weight = self.weights[index]
-            if val == 0:
-                self.weights[index] -= self.learning_rate * weight
-            elif val == 1:
-                self.weights[index] += self.learning_rate * (1-weight)
+        mult = (((self._update_mask[sentence] & self._pow2) != 0).astype(np.float64)
+                - self._half_discount * ((self._half_mask[sentence] & self._pow2) != 0))
+        bits = ((hypothesis_grammar & self._pow2) != 0).astype(np.float64)
+        self.weights += self.learning_rate * mult * (bits - self.weights)
+        self._thresh_stale = True
 
     def punish(*args):
         pass
 
-class SkepticalRewardOnlyLearner(VariationalLearner):
+class SkepticalRewardOnlyLearner(RewardOnlyRelevantLearner):
     """A Reward-only-relevant learner that uses knowledge of ambiguity
-    to temper weight adjustments.
+    to temper weight adjustments: if `sentence` is known to be ambiguous
+    evidence wrt Pi, be conservative in adjusting Pi (half the learning
+    rate, via the packed ambiguity mask).
     """
-    def reward(self, hypothesis_grammar, sentence):
-        """ If `sentence` is known to be ambiguous evidence wrt Pi, be
-        conservative in adjusting Pi. """
-        trigger_str = self.domain.sentence_irr[sentence]
-        for index in range(13):
-            if trigger_str[index] == '~':
-                continue
-            learning_rate = self.learning_rate
-            if trigger_str[index] == '*':
-                learning_rate = learning_rate / 2
-            val = get_param_value(12-index, hypothesis_grammar)
-            weight = self.weights[index]
-            if val == 0:
-                self.weights[index] -= learning_rate * weight
-            elif val == 1:
-                self.weights[index] += learning_rate * (1-weight)
-
-    def punish(*args):
-        pass
+    ambiguous_lr = 0.5
 
 class PunishOnlyLearner(RewardOnlyLearner):
+    # punish is not a no-op here, so skip RewardOnlyLearner's compiled
+    # reward-only consume path.
+    consume = VariationalLearner.consume
+
     def reward(self, hypothesis_grammar, sentence):
         pass
 
     def punish(self, hypothesis_grammar, sentence):
-        ones = (2 ** self.domain.num_params) - 1
-        return super().reward(hypothesis_grammar ^ ones, sentence)
+        # reward the mirror-image grammar directly: flip every real
+        # parameter bit. (pow2 != 0) restricts the inversion to the real
+        # lanes so the padding stays at 0.
+        bits = ((hypothesis_grammar & self._pow2) != 0).astype(np.float64)
+        inv_bits = (self._pow2 != 0) - bits
+        self.weights += self.learning_rate * (inv_bits - self.weights)
+        self._thresh_stale = True
 
 
 #### Simulation Code - this is temporary and should be refactored
@@ -203,27 +484,70 @@ class PunishOnlyLearner(RewardOnlyLearner):
 def choose_sentence(language):
     return random.choice(language)
 
-def learn_language(learner, target_language, iterations):
-    weights = [0.5] * 13
+def learn_language(learner, target_language, iterations, check_every=64,
+                   patience=4, ema_decay=0.99, ema_tol=1e-4):
+    """Feed the learner random sentences from `target_language` until its
+    weights converge, its weights stop moving, or `iterations` is reached.
+    Returns the number of sentences consumed.
+
+    Stopping is only evaluated every `check_every` sentences: convergence is
+    slow relative to the learning rate, so per-sentence checks are wasted
+    work. Besides the converged() test, an exponential moving average of the
+    weights is maintained at the same cadence; if the weights stay within
+    `ema_tol` of the EMA for `patience` consecutive checks the learner has
+    stalled (e.g. almost nothing parses) and we stop early.
+    """
     threshold = 0.02
+    ema = np.array(learner.weights, dtype=np.float64)
+    stable_checks = 0
     counter = 0
 
-    while not learner.converged(threshold):
-        sentence = choose_sentence(target_language)
-        learner.consume(sentence)
-        if counter >= iterations:
-            break
+    # hoist the per-iteration attribute lookups out of the loop; the bound
+    # methods and the weights array itself are invariant (consume updates the
+    # weights in place)
+    consume = learner.consume
+    converged = learner.converged
+    draw_indices = learner.rng.integers
+    weights = learner.weights
+
+    # draw sentence indices in batches of 1024 rather than one
+    # random.choice call per sentence
+    target = np.asarray(target_language, dtype=np.int64)
+    buf_size = 1024
+    idx_buf = draw_indices(0, target.size, size=buf_size)
+    cursor = 0
+
+    while counter < iterations:
+        if counter % check_every == 0:
+            if converged(threshold):
+                break
+            if counter:
+                ema = ema_decay * ema + (1 - ema_decay) * weights
+                if np.max(np.abs(weights - ema)) < ema_tol:
+                    stable_checks += 1
+                    if stable_checks >= patience:
+                        break
+                else:
+                    stable_checks = 0
+        if cursor == buf_size:
+            idx_buf = draw_indices(0, target.size, size=buf_size)
+            cursor = 0
+        sentence = int(target[idx_buf[cursor]])
+        cursor += 1
+        consume(sentence)
         counter += 1
 
     return counter
 
 def weights_to_params(weights):
-    return ''.join(str(round(x)) for x in weights)
+    return ''.join(np.round(np.asarray(weights)).astype(np.int64).astype(str))
 
 def run_vl_on_languages(Learner, grammar_ids, num_learners, num_sentences, domain=None):
     domain = domain or Colag.default()
+    indptr, data = _language_csr(domain)
     for grammar in grammar_ids:
-        language = tuple(domain.language[grammar])
+        # a view into the CSR language data shared by every trial
+        language = data[indptr[grammar]:indptr[grammar + 1]]
         for trial_num in range(num_learners):
             learner = Learner(domain)
 
@@ -236,7 +560,104 @@ def run_vl_on_languages(Learner, grammar_ids, num_learners, num_sentences, domai
                           trial_num,
                           sentences_consumed,
                           learner.choose_grammar()]
-            result += learner.weights
+            result += list(learner.weights[:domain.num_params])
+            result += ['', runtime]
+            yield result
+
+# the domain is shared with worker processes through the pool initializer so
+# it is pickled once per worker instead of once per task
+_worker_domain = None
+
+def _init_trial_worker(domain):
+    global _worker_domain
+    _worker_domain = domain
+
+def _run_one_trial(args):
+    """ Run a single learner trial. Must be a top-level function so the
+    multiprocessing pool can pickle it. """
+    Learner, grammar, trial_num, num_sentences = args
+    domain = _worker_domain
+    learner = Learner(domain)
+    # a view into the CSR language data cached on the domain; no per-trial
+    # copy of the sentence pool
+    indptr, data = _language_csr(domain)
+    language = data[indptr[grammar]:indptr[grammar + 1]]
+
+    start = datetime.now()
+    sentences_consumed = learn_language(learner, language, iterations=num_sentences)
+    runtime = datetime.now() - start
+
+    result = [grammar,
+                  trial_num,
+                  sentences_consumed,
+                  learner.choose_grammar()]
+    result += list(learner.weights[:domain.num_params])
+    result += ['', runtime]
+    return result
+
+def run_vl_on_languages_parallel(Learner, grammar_ids, num_learners,
+                                 num_sentences, domain=None, processes=None):
+    """Like run_vl_on_languages, but runs the independent learner trials
+    across a process pool. Rows are yielded as trials finish, so they arrive
+    in no particular order; each row carries its grammar and trial number.
+    """
+    domain = domain or Colag.default()
+    tasks = [(Learner, grammar, trial_num, num_sentences)
+                 for grammar in grammar_ids
+                 for trial_num in range(num_learners)]
+    with Pool(processes or cpu_count(),
+              initializer=_init_trial_worker,
+              initargs=(domain,)) as pool:
+        yield from pool.imap_unordered(_run_one_trial, tasks, chunksize=4)
+
+def run_vl_batched(Learner, grammar_ids, num_learners, num_sentences,
+                   domain=None, threshold=0.02):
+    """Batched drop-in for run_vl_on_languages: steps all `num_learners`
+    trials for a grammar in lockstep through the parallel numba kernel,
+    with the weight vectors stacked into one (num_learners, num_params)
+    matrix. Yields the same row format, except the reported runtime is for
+    the whole batch of trials, not one trial. Falls back to the sequential
+    runner when numba is unavailable.
+    """
+    if njit is None:
+        yield from run_vl_on_languages(Learner, grammar_ids, num_learners,
+                                       num_sentences, domain=domain)
+        return
+
+    domain = domain or Colag.default()
+    probe = Learner(domain)
+    run_trials_reward_only = probe._kernels[2]
+    if probe.ambiguous_lr is not None:
+        lr_masks = _sentence_lr_matrix(domain, ambiguous=probe.ambiguous_lr)
+        has_masks = True
+    else:
+        lr_masks = np.zeros((1, _padded_size(domain.num_params)), dtype=np.float32)
+        lr_masks[:, :domain.num_params] = 1.0
+        has_masks = False
+    indptr, data = _language_csr(domain)
+
+    for grammar in grammar_ids:
+        language = data[indptr[grammar]:indptr[grammar + 1]]
+        weights = np.zeros((num_learners, _padded_size(domain.num_params)),
+                           dtype=np.float32)
+        weights[:, :domain.num_params] = 0.5
+
+        start = datetime.now()
+        counts = run_trials_reward_only(weights, probe._pow2, probe._legal,
+                                        indptr, data, language,
+                                        lr_masks, has_masks,
+                                        probe.learning_rate,
+                                        num_sentences, threshold)
+        runtime = datetime.now() - start
+
+        for trial_num in range(num_learners):
+            probe.weights = weights[trial_num]
+            probe._thresh_stale = True
+            result = [grammar,
+                          trial_num,
+                          int(counts[trial_num]),
+                          probe.choose_grammar()]
+            result += list(weights[trial_num][:domain.num_params])
             result += ['', runtime]
             yield result
 
@@ -23,7 +23,7 @@ class HistoryReporter():
             self.__counter += 1
             return val
 
-        row = [self.__name] + self.weights
+        row = [self.__name] + list(self.weights[:self.domain.num_params])
 
         print('\t'.join(map(str, row)))
 